@@ -34,13 +34,15 @@ class Counter(Actor):
 
     def __init__(self):
         self.count = 0
-        self.rank = current_rank()
+        # current_rank() returns a Point object; keep just the integer rank so
+        # replies stay small
+        self.rank = current_rank().rank
 
     @endpoint
-    def increment(self) -> dict:
-        """Increment the count and return info about this actor."""
+    def increment(self) -> tuple[int, int]:
+        """Increment the count and return (rank, count) for this actor."""
         self.count += 1
-        return {"rank": self.rank, "count": self.count}
+        return (self.rank, self.count)
 
     @endpoint
     def get_count(self) -> int:
@@ -63,20 +65,20 @@ def main():
 
     print("\n--- call(): Call all actors ---")
     # call().get() returns a ValueMesh containing results from all actors
-    results: ValueMesh[dict] = counters.increment.call().get()
+    results: ValueMesh[tuple[int, int]] = counters.increment.call().get()
     # Use .items() to iterate with coordinates, or .values() for just values
-    for point, r in results.items():
-        print(f"  Point {point}: count = {r['count']}")
+    for point, (rank, count) in results.items():
+        print(f"  Point {point}: count = {count}")
 
     print("\n--- Calling again to show state persists ---")
     results = counters.increment.call().get()
-    for r in results.values():
-        print(f"  Rank {r['rank']}: count = {r['count']}")
+    for rank, count in results.values():
+        print(f"  Rank {rank}: count = {count}")
 
     print("\n--- slice() + call_one(): Call a specific actor ---")
     # slice() selects actors by coordinate, then call_one() calls the single actor
-    result = counters.slice(procs=0).increment.call_one().get()
-    print(f"  Rank {result['rank']}: count = {result['count']}")
+    rank, count = counters.slice(procs=0).increment.call_one().get()
+    print(f"  Rank {rank}: count = {count}")
 
     print("\n--- Get all counts to see the difference ---")
     counts = counters.get_count.call().get()
@@ -85,8 +87,8 @@ def main():
 
     print("\n--- choose(): Let system pick one actor ---")
     # choose() picks one actor (useful for load balancing)
-    result = counters.increment.choose().get()
-    print(f"  Rank {result['rank']}: count = {result['count']}")
+    rank, count = counters.increment.choose().get()
+    print(f"  Rank {rank}: count = {count}")
 
     print("\n--- broadcast(): Fire-and-forget to all actors ---")
     # broadcast() sends to all actors but doesn't wait for results
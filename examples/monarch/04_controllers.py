@@ -18,7 +18,12 @@
 # ]
 # ///
 
+import torch
 from monarch.actor import Actor, endpoint, current_rank, this_host, get_or_spawn_controller
+from monarch.rdma import RDMABuffer, is_rdma_available
+
+# Each worker gets one RDMA slot in the aggregator: [count, value_0, value_1, ...]
+SLOT_CAPACITY = 16
 
 
 class MetricsAggregator(Actor):
@@ -29,24 +34,79 @@ class MetricsAggregator(Actor):
 
     def __init__(self):
         self.metrics: dict[int, list[float]] = {}
+        # Running totals, kept up to date on every report so neither report()
+        # nor get_summary() has to rescan the stored values
+        self._total = 0
+        self._sums: dict[int, float] = {}
+        self._counts: dict[int, int] = {}
+        # Per-worker memory that workers write into directly with RDMA
+        self._slots: dict[int, torch.Tensor] = {}
+        self._slot_handles: dict[int, RDMABuffer] = {}
         print("MetricsAggregator spawned!")
 
     @endpoint
     def report(self, worker_id: int, value: float) -> int:
         """Workers call this to report metrics. Returns total reports received."""
-        if worker_id not in self.metrics:
-            self.metrics[worker_id] = []
-        self.metrics[worker_id].append(value)
-        total = sum(len(v) for v in self.metrics.values())
-        return total
+        self._record(worker_id, [value])
+        return self._total
+
+    @endpoint
+    def report_batch(self, worker_id: int, values: list[float]) -> None:
+        """Report several metrics in one message. Meant to be sent with .broadcast()."""
+        self._record(worker_id, values)
+
+    def _record(self, worker_id: int, values: list[float]) -> None:
+        self.metrics.setdefault(worker_id, []).extend(values)
+        self._sums[worker_id] = self._sums.get(worker_id, 0.0) + sum(values)
+        self._counts[worker_id] = self._counts.get(worker_id, 0) + len(values)
+        self._total += len(values)
+
+    @endpoint
+    def get_slot_handle(self, worker_id: int) -> RDMABuffer:
+        """Return an RDMA handle to this worker's slot.
+
+        Workers fetch this once and then write metrics straight into our
+        memory. A one-sided write doesn't run any code on this actor, so
+        reporting costs nothing here until we call drain().
+        """
+        if worker_id not in self._slot_handles:
+            slot = torch.zeros(1 + SLOT_CAPACITY, dtype=torch.float64)
+            self._slots[worker_id] = slot
+            self._slot_handles[worker_id] = RDMABuffer(slot.view(torch.uint8).flatten())
+        return self._slot_handles[worker_id]
+
+    @endpoint
+    def drain(self) -> int:
+        """Fold everything written into the RDMA slots into the metrics.
+
+        Returns the number of values drained. Each slot holds one batch, so
+        workers should write at most once between drains.
+        """
+        drained = 0
+        for worker_id, slot in self._slots.items():
+            count = int(slot[0])
+            if count:
+                self._record(worker_id, slot[1 : 1 + count].tolist())
+                slot[0] = 0
+                drained += count
+        return drained
+
+    @endpoint
+    def flush(self) -> int:
+        """Returns total reports received.
+
+        Messages from one caller arrive in order, so once this returns, every
+        report_batch that caller sent before it has been applied.
+        """
+        return self._total
 
     @endpoint
     def get_summary(self) -> dict:
         """Get aggregated metrics from all workers."""
         return {
             "num_workers": len(self.metrics),
-            "reports_per_worker": {k: len(v) for k, v in self.metrics.items()},
-            "averages": {k: sum(v) / len(v) for k, v in self.metrics.items() if v},
+            "reports_per_worker": dict(self._counts),
+            "averages": {k: self._sums[k] / n for k, n in self._counts.items() if n},
         }
 
 
@@ -60,6 +120,11 @@ class Worker(Actor):
         # current_rank() returns a Point object with coordinates
         # Use .rank to get the integer rank
         self.rank = current_rank().rank
+        # Local staging buffer for RDMA reports, same layout as the aggregator slot
+        self._local_slot = torch.zeros(1 + SLOT_CAPACITY, dtype=torch.float64)
+        # RDMA works on raw bytes; this view shares storage with _local_slot
+        self._local_slot_bytes = self._local_slot.view(torch.uint8).flatten()
+        self._slot_handle: RDMABuffer | None = None
 
     @endpoint
     def do_work(self) -> str:
@@ -67,12 +132,31 @@ class Worker(Actor):
         # If it doesn't exist yet, this spawns it. If it does, we get the existing one.
         aggregator = get_or_spawn_controller("metrics", MetricsAggregator).get()
 
-        # Simulate doing work and reporting metrics
-        for i in range(3):
-            value = self.rank * 10.0 + i
-            total = aggregator.report.call_one(self.rank, value).get()
+        # Simulate doing work, collecting metrics locally
+        values = [self.rank * 10.0 + i for i in range(3)]
+
+        # Send them all in one fire-and-forget message instead of waiting on a
+        # round-trip per value, then wait once at the end
+        aggregator.report_batch.broadcast(self.rank, values)
+        total = aggregator.flush.call_one().get()
+
+        return f"Worker {self.rank} reported {len(values)} values (aggregator total: {total})"
 
-        return f"Worker {self.rank} reported 3 values"
+    @endpoint
+    def do_work_rdma(self) -> str:
+        """Same work, but report by writing directly into the aggregator's memory."""
+        aggregator = get_or_spawn_controller("metrics", MetricsAggregator).get()
+
+        # The handle never changes, so fetch it once
+        if self._slot_handle is None:
+            self._slot_handle = aggregator.get_slot_handle.call_one(self.rank).get()
+
+        values = [self.rank * 10.0 + i for i in range(3)]
+        self._local_slot[0] = len(values)
+        self._local_slot[1 : 1 + len(values)] = torch.tensor(values, dtype=torch.float64)
+        self._slot_handle.write_from(self._local_slot_bytes).get()
+
+        return f"Worker {self.rank} wrote {len(values)} values via RDMA"
 
 
 def main():
@@ -102,6 +186,17 @@ def main():
     print(f"  Averages: {summary['averages']}")
 
     print()
+    if is_rdma_available():
+        # Workers write metrics straight into the aggregator's memory. The
+        # aggregator only does work when we ask it to drain.
+        print("Workers reporting via one-sided RDMA writes...")
+        for result in workers.do_work_rdma.call().get().values():
+            print(f"  {result}")
+        drained = aggregator.drain.call_one().get()
+        summary = aggregator.get_summary.call_one().get()
+        print(f"  Drained {drained} values; reports per worker: {summary['reports_per_worker']}")
+        print()
+
     print("Key insight: 'MetricsAggregator spawned!' printed only ONCE.")
     print("All workers and the main process found the same instance by name.")
 
@@ -19,9 +19,13 @@
 # ]
 # ///
 
+import random
 import time
 from monarch.actor import Actor, endpoint, current_rank, this_host
 
+# One RNG per process, shared by every do_work call
+_rng = random.Random()
+
 
 class UnreliableWorker(Actor):
     """A worker that might fail."""
@@ -33,15 +37,16 @@ class UnreliableWorker(Actor):
         self.tasks_completed = 0
 
     @endpoint
-    def do_work(self, task_id: int) -> dict:
-        """Do some work. Might fail based on fail_probability."""
-        import random
+    def do_work(self, task_id: int) -> tuple[int, int, int]:
+        """Do some work. Might fail based on fail_probability.
 
-        if random.random() < self.fail_probability:
+        Returns (rank, task_id, tasks_completed).
+        """
+        if _rng.random() < self.fail_probability:
             raise RuntimeError(f"Worker {self.rank} crashed on task {task_id}!")
 
         self.tasks_completed += 1
-        return {"rank": self.rank, "task_id": task_id, "completed": self.tasks_completed}
+        return (self.rank, task_id, self.tasks_completed)
 
     @endpoint
     def crash(self) -> None:
@@ -96,8 +101,7 @@ class Supervisor(Actor):
         for task_id in range(num_tasks):
             try:
                 task_results = self.workers.do_work.call(task_id).get()
-                for point, result in task_results.items():
-                    results.append(result)
+                results.extend(task_results.values())
             except Exception as e:
                 print(f"[SUPERVISOR] Task {task_id} failed: {e}")
 
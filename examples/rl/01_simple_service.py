@@ -1,7 +1,7 @@
 # Simple Service
 #
 # A Service wraps multiple worker replicas and provides:
-# - Round-robin routing to healthy replicas
+# - Routing to healthy replicas (round-robin, random, or power-of-two)
 # - Failure detection via __supervise__
 # - Health tracking so callers can mark replicas unhealthy
 #
@@ -16,9 +16,35 @@
 # ]
 # ///
 
+import logging
 import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import torch
 from monarch.actor import Actor, endpoint, current_rank, this_host
 
+# Failure reports go through logging so they're only formatted when the
+# level is enabled. Only this module's logger is configured (INFO, plain
+# messages) so the root logger - and monarch's logging - is left alone.
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+# How many failure draws Worker generates at a time
+FAIL_DRAW_BATCH = 4096
+
+# Replica selection policies supported by the service
+BALANCERS = ("round_robin", "random", "power_of_two")
+
+# power_of_two only counts failures from the last FAIL_WINDOW seconds
+FAIL_WINDOW = 60.0
+
 
 # =============================================================================
 # Worker: The actual work happens here
@@ -33,12 +59,30 @@ class Worker(Actor):
         self.fail_rate = fail_rate
         self.calls = 0
 
+        # Failure decisions are drawn in batches and consumed one per call.
+        # Each worker seeds its own generator from OS entropy; torch's default
+        # generator starts from the same fixed seed in every process, which
+        # would make every replica fail on the same calls.
+        self._gen = torch.Generator()
+        self._gen.seed()
+        self._fail_mask: list[bool] = []
+        self._fail_ptr = 0
+
+    def _should_fail(self) -> bool:
+        """Return the next pre-drawn failure decision, refilling when used up."""
+        if self._fail_ptr >= len(self._fail_mask):
+            self._fail_mask = (torch.rand(FAIL_DRAW_BATCH, generator=self._gen) < self.fail_rate).tolist()
+            self._fail_ptr = 0
+        fail = self._fail_mask[self._fail_ptr]
+        self._fail_ptr += 1
+        return fail
+
     @endpoint
     def process(self, data: str) -> dict:
         """Process some data. Might fail based on fail_rate."""
         self.calls += 1
 
-        if random.random() < self.fail_rate:
+        if self._should_fail():
             raise RuntimeError(f"Worker {self.rank} failed on call {self.calls}!")
 
         return {
@@ -64,11 +108,26 @@ class Service(Actor):
     The Service:
     1. Spawns worker replicas at startup
     2. Tracks which replicas are healthy
-    3. Routes requests round-robin to healthy replicas
+    3. Routes requests to healthy replicas (round-robin by default)
     4. Detects failures via __supervise__
     """
 
-    def __init__(self, worker_class: type, num_replicas: int, *worker_args, **worker_kwargs):
+    def __init__(
+        self,
+        worker_class: type,
+        num_replicas: int,
+        *worker_args,
+        balancer: str = "round_robin",
+        verbose: bool = False,
+        **worker_kwargs,
+    ):
+        if balancer not in BALANCERS:
+            raise ValueError(f"Unknown balancer {balancer!r}, expected one of {BALANCERS}")
+        self.balancer = balancer
+        # Events are buffered instead of printed, so a burst of health changes
+        # doesn't serialize endpoint calls on stdout. Read them with flush_logs().
+        self.verbose = verbose
+        self._log: deque[tuple[float, str]] = deque(maxlen=1024)
         self.worker_class = worker_class
         self.num_replicas = num_replicas
         self.worker_args = worker_args
@@ -78,68 +137,146 @@ class Service(Actor):
         worker_procs = this_host().spawn_procs(per_host={"procs": num_replicas})
         self.workers = worker_procs.spawn("workers", worker_class, *worker_args, **worker_kwargs)
 
-        # Track health: set of healthy worker ranks
-        self.healthy = set(range(num_replicas))
+        # Slice out each worker once up front; get_replica reuses these
+        self._worker_slices = [self.workers.slice(procs=r) for r in range(num_replicas)]
+
+        # Track health as a bitmask: bit r is set if worker rank r is healthy.
+        # The sorted list of healthy ranks is used for routing and only rebuilt
+        # when health changes.
+        self.healthy_mask = (1 << num_replicas) - 1
+        self._healthy_sorted: list[int] = list(range(num_replicas))
 
-        # Round-robin index
+        # Round-robin index, and per-replica failure times for power_of_two
         self.next_idx = 0
+        self._fail_times: list[deque] = [deque() for _ in range(num_replicas)]
+
+        # Health epoch per replica, bumped each time it's marked unhealthy.
+        # Callers hand back the epoch they saw, so a late report about a
+        # failure we've already handled is recognized as stale and ignored.
+        self._epoch = [0] * num_replicas
+
+        # Health only changes in mark_unhealthy/mark_healthy, but
+        # get_health_status can be called any number of times in between.
+        # Build its response here and rebuild it only on those changes.
+        self._status_dict = self._build_status()
 
         print(f"Service: spawned {num_replicas} replicas")
 
     def __supervise__(self, failure) -> bool:
         """Called when a worker fails. Mark it unhealthy."""
-        report = failure.report()
-        print(f"[SERVICE] Failure detected: {report[:100]}...")
+        # failure.report() can build a large string. Only pay for it if the
+        # message will actually be emitted.
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("[SERVICE] Failure detected: %.100s...", failure.report())
 
         # In a real system, we'd parse the failure to identify which worker
         # For now, we rely on explicit mark_unhealthy calls
         return True  # Handled
 
     @endpoint
-    def get_replica(self) -> Actor:
+    def get_replica(self) -> tuple[int, int, Actor]:
         """
-        Get a healthy replica (round-robin selection).
-        Returns the worker actor reference.
+        Get a healthy replica (selected by self.balancer).
+        Returns (replica_rank, epoch, worker actor reference). The rank and
+        epoch are what callers pass back to mark_unhealthy.
         """
-        if not self.healthy:
+        if not self._healthy_sorted:
             raise RuntimeError("No healthy replicas available!")
 
-        # Convert to sorted list for consistent ordering
-        healthy_list = sorted(self.healthy)
+        replica_rank = self._pick()
+
+        # Return the specific worker (sliced once in __init__)
+        return (replica_rank, self._epoch[replica_rank], self._worker_slices[replica_rank])
 
-        # Round-robin selection
-        idx = self.next_idx % len(healthy_list)
+    def _pick(self) -> int:
+        """Choose a healthy replica according to self.balancer.
+
+        power_of_two samples two distinct healthy replicas and keeps the one
+        with fewer failures in the last FAIL_WINDOW seconds. Only replicas
+        that were marked healthy again can have recent failures, so until
+        one recovers this behaves like random.
+        """
+        healthy = self._healthy_sorted
+        if self.balancer == "random":
+            # No shared counter to update, so nothing to contend on
+            return healthy[random.randrange(len(healthy))]
+        if self.balancer == "power_of_two":
+            if len(healthy) == 1:
+                return healthy[0]
+            a, b = random.sample(healthy, 2)
+            return a if self._recent_failures(a) <= self._recent_failures(b) else b
+
+        # Round-robin selection over the sorted list (consistent ordering)
+        idx = self.next_idx % len(healthy)
         self.next_idx += 1
+        return healthy[idx]
 
-        replica_rank = healthy_list[idx]
+    def _recent_failures(self, idx: int) -> int:
+        """Number of times replica idx went down in the last FAIL_WINDOW seconds."""
+        times = self._fail_times[idx]
+        cutoff = time.monotonic() - FAIL_WINDOW
+        while times and times[0] < cutoff:
+            times.popleft()
+        return len(times)
+
+    def _build_status(self) -> dict:
+        return {
+            "total": self.num_replicas,
+            "healthy": len(self._healthy_sorted),
+            "healthy_ranks": list(self._healthy_sorted),
+        }
 
-        # Return the specific worker using slice
-        return self.workers.slice(procs=replica_rank)
+    def _rebuild_healthy(self) -> None:
+        """Recompute the sorted list of healthy replicas from the bitmask."""
+        self._healthy_sorted = [i for i in range(self.num_replicas) if self.healthy_mask & (1 << i)]
+        self._status_dict = self._build_status()
 
     @endpoint
-    def mark_unhealthy(self, replica_rank: int) -> None:
-        """Mark a replica as unhealthy. Called by user after failure."""
-        if replica_rank in self.healthy:
-            self.healthy.remove(replica_rank)
-            print(f"[SERVICE] Marked replica {replica_rank} as unhealthy. "
-                  f"Healthy: {len(self.healthy)}/{self.num_replicas}")
+    def mark_unhealthy(self, replica_rank: int, epoch: int | None = None) -> None:
+        """Mark a replica as unhealthy. Called by user after failure.
+
+        If epoch is given and doesn't match the replica's current epoch, the
+        report is about a failure that was already handled, so it's ignored.
+        Many callers hitting the same dead replica only mark it down once.
+        """
+        if not 0 <= replica_rank < self.num_replicas:
+            return
+        if epoch is not None and epoch != self._epoch[replica_rank]:
+            return
+        if self.healthy_mask & (1 << replica_rank):
+            self._fail_times[replica_rank].append(time.monotonic())
+            self._epoch[replica_rank] += 1
+            self.healthy_mask &= ~(1 << replica_rank)
+            self._rebuild_healthy()
+            self._log_event(f"[SERVICE] Marked replica {replica_rank} as unhealthy. "
+                            f"Healthy: {len(self._healthy_sorted)}/{self.num_replicas}")
 
     @endpoint
     def mark_healthy(self, replica_rank: int) -> None:
         """Mark a replica as healthy again (after recovery)."""
-        if replica_rank < self.num_replicas:
-            self.healthy.add(replica_rank)
-            print(f"[SERVICE] Marked replica {replica_rank} as healthy. "
-                  f"Healthy: {len(self.healthy)}/{self.num_replicas}")
+        if 0 <= replica_rank < self.num_replicas:
+            self.healthy_mask |= 1 << replica_rank
+            self._rebuild_healthy()
+            self._log_event(f"[SERVICE] Marked replica {replica_rank} as healthy. "
+                            f"Healthy: {len(self._healthy_sorted)}/{self.num_replicas}")
+
+    def _log_event(self, msg: str) -> None:
+        """Buffer an event for flush_logs(); also print it when verbose."""
+        self._log.append((time.monotonic(), msg))
+        if self.verbose:
+            print(msg)
+
+    @endpoint
+    def flush_logs(self) -> list[tuple[float, str]]:
+        """Return and clear buffered (timestamp, message) events."""
+        out = list(self._log)
+        self._log.clear()
+        return out
 
     @endpoint
     def get_health_status(self) -> dict:
-        """Get current health status."""
-        return {
-            "total": self.num_replicas,
-            "healthy": len(self.healthy),
-            "healthy_ranks": sorted(self.healthy),
-        }
+        """Get current health status. Callers must not mutate the result."""
+        return self._status_dict
 
 
 # =============================================================================
@@ -147,42 +284,89 @@ class Service(Actor):
 # =============================================================================
 
 
-def call_with_retry(service, method: str, *args, max_retries: int = 3, **kwargs):
+# Client-side record of when each failure was last reported. When many
+# threads hit the same dead replica at once, only the first one sends
+# mark_unhealthy; the rest skip it for UNHEALTHY_DEBOUNCE seconds. Keyed by
+# (service, rank, epoch), so only reports of the same failure are dropped -
+# the ones the Service would ignore as stale anyway.
+UNHEALTHY_DEBOUNCE = 0.1
+_recent_unhealthy: dict[tuple[int, int, int], float] = {}
+_recent_unhealthy_lock = threading.Lock()
+
+
+def _should_report_unhealthy(service, replica_rank: int, epoch: int) -> bool:
+    key = (id(service), replica_rank, epoch)
+    now = time.monotonic()
+    with _recent_unhealthy_lock:
+        if now - _recent_unhealthy.get(key, float("-inf")) < UNHEALTHY_DEBOUNCE:
+            return False
+        # Drop expired entries so the table doesn't grow with every epoch
+        for k in [k for k, t in _recent_unhealthy.items() if now - t >= UNHEALTHY_DEBOUNCE]:
+            del _recent_unhealthy[k]
+        _recent_unhealthy[key] = now
+        return True
+
+
+def call_with_retry(
+    service,
+    method: str,
+    *args,
+    max_retries: int = 3,
+    base_delay: float = 0.01,
+    max_delay: float = 1.0,
+    deadline: float = 5.0,
+    **kwargs,
+):
     """
     Call a method on a service replica with retry logic.
 
     This is the pattern for using a Service:
     1. Get a replica from the service
     2. Try the call
-    3. On failure, mark unhealthy and retry with a different replica
+    3. On failure, mark unhealthy, back off, and retry with a different replica
+
+    The backoff doubles each attempt (capped at max_delay) with random jitter,
+    so many callers failing at once don't all hit the Service again at the
+    same moment. No new attempt starts once `deadline` seconds have passed.
     """
     last_error = None
+    start = time.monotonic()
+    attempts = 0
 
     for attempt in range(max_retries):
-        # Get a healthy replica
+        if attempt > 0 and time.monotonic() - start > deadline:
+            break
+        attempts += 1
+
+        # Get a healthy replica, along with its rank for health tracking
         try:
-            replica = service.get_replica.call_one().get()
+            replica_rank, epoch, replica = service.get_replica.call_one().get()
         except RuntimeError as e:
             print(f"[CALLER] No healthy replicas: {e}")
             raise
 
-        # Get the replica's rank for health tracking
-        replica_rank = replica.get_id.call_one().get()
+        # Look up the endpoint once per replica we pick
+        method_fn = getattr(replica, method)
 
         try:
             # Call the method
-            method_fn = getattr(replica, method)
-            result = method_fn.call_one(*args, **kwargs).get()
-            return result
+            return method_fn.call_one(*args, **kwargs).get()
 
         except Exception as e:
             print(f"[CALLER] Attempt {attempt + 1} failed on replica {replica_rank}: {e}")
             last_error = e
 
-            # Mark this replica as unhealthy
-            service.mark_unhealthy.call_one(replica_rank).get()
+            # Mark this replica as unhealthy, unless another caller in this
+            # process just reported the same failure (same rank and epoch)
+            if _should_report_unhealthy(service, replica_rank, epoch):
+                service.mark_unhealthy.call_one(replica_rank, epoch).get()
+
+            # Back off before the next attempt: exponential, capped, with jitter
+            if attempt < max_retries - 1:
+                delay = min(max_delay, base_delay * (2 ** attempt)) * (0.5 + random.random())
+                time.sleep(delay)
 
-    raise RuntimeError(f"All {max_retries} attempts failed. Last error: {last_error}")
+    raise RuntimeError(f"All {attempts} attempts failed. Last error: {last_error}")
 
 
 def main():
@@ -200,18 +384,30 @@ def main():
     status = service.get_health_status.call_one().get()
     print(f"Healthy: {status['healthy']}/{status['total']} - ranks: {status['healthy_ranks']}")
 
-    print("\n--- Making calls with retry logic ---")
-    for i in range(8):
+    print("\n--- Making calls with retry logic (all requests in flight at once) ---")
+
+    # Each request runs its own retry loop on a thread, so requests overlap
+    # instead of waiting for each other. With 4 replicas, several requests
+    # are being served at the same time.
+    def run_request(i: int):
         try:
-            result = call_with_retry(service, "process", f"request_{i}")
-            print(f"Request {i}: {result['result']}")
+            return call_with_retry(service, "process", f"request_{i}")
         except RuntimeError as e:
-            print(f"Request {i}: FAILED - {e}")
+            return e
+
+    num_requests = 8
+    with ThreadPoolExecutor(max_workers=num_requests) as pool:
+        outcomes = list(pool.map(run_request, range(num_requests)))
+
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Request {i}: FAILED - {outcome}")
+        else:
+            print(f"Request {i}: {outcome['result']}")
 
-        # Check health after each request
-        status = service.get_health_status.call_one().get()
-        if status['healthy'] < status['total']:
-            print(f"  (Healthy: {status['healthy']}/{status['total']})")
+    print("\n--- Service event log ---")
+    for ts, msg in service.flush_logs.call_one().get():
+        print(f"  {msg}")
 
     print("\n--- Final health status ---")
     status = service.get_health_status.call_one().get()
@@ -219,7 +415,7 @@ def main():
 
     print("\n--- Key Points ---")
     print("1. Service owns workers and tracks health")
-    print("2. get_replica() returns a healthy worker (round-robin)")
+    print("2. get_replica() returns (rank, epoch, replica) picked by the balancer")
     print("3. On failure, caller marks replica unhealthy and retries")
     print("4. __supervise__ detects failures (for logging/alerting)")
     print("\nSee 01b_service_mesh_replicas.py for mesh replicas (scales to multi-host)")
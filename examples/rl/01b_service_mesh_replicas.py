@@ -22,8 +22,29 @@
 # ]
 # ///
 
+import logging
+import random
+import time
+from collections import deque
 from monarch.actor import Actor, endpoint, current_rank, this_host
 
+# Failure reports go through logging so they're only formatted when the
+# level is enabled. Only this module's logger is configured (INFO, plain
+# messages) so the root logger - and monarch's logging - is left alone.
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+# Replica selection policies supported by the service
+BALANCERS = ("round_robin", "random", "power_of_two")
+
+# power_of_two only counts failures from the last FAIL_WINDOW seconds
+FAIL_WINDOW = 60.0
+
 
 # =============================================================================
 # Worker: Same as before, but now part of a mesh
@@ -76,7 +97,16 @@ class MeshService(Actor):
         worker_class: type,
         replica_procs,  # ProcMesh to slice into replicas
         procs_per_replica: int,
+        balancer: str = "round_robin",
+        verbose: bool = False,
     ):
+        if balancer not in BALANCERS:
+            raise ValueError(f"Unknown balancer {balancer!r}, expected one of {BALANCERS}")
+        self.balancer = balancer
+        # Events are buffered instead of printed, so a burst of health changes
+        # doesn't serialize endpoint calls on stdout. Read them with flush_logs().
+        self.verbose = verbose
+        self._log: deque[tuple[float, str]] = deque(maxlen=1024)
         self.worker_class = worker_class
         self.procs_per_replica = procs_per_replica
 
@@ -103,64 +133,129 @@ class MeshService(Actor):
             replica_mesh = replica_slice.spawn(f"replica_{i}", worker_class)
             self.replicas.append(replica_mesh)
 
-        # Health tracking
-        self.healthy = set(range(self.num_replicas))
+        # Health tracking as a bitmask: bit i is set if replica i is healthy.
+        # The sorted list of healthy indices is used for routing and only
+        # rebuilt when health changes.
+        self.healthy_mask = (1 << self.num_replicas) - 1
+        self._healthy_sorted: list[int] = list(range(self.num_replicas))
         self.next_idx = 0
+        # Per-replica failure times, used by the power_of_two balancer
+        self._fail_times: list[deque] = [deque() for _ in range(self.num_replicas)]
+
+        # get_health_status returns this prebuilt dict; it's rebuilt together
+        # with _healthy_sorted whenever a replica changes state.
+        self._status_dict = self._build_status()
 
         print(f"MeshService: {self.num_replicas} replicas × {procs_per_replica} procs each")
 
     def __supervise__(self, failure) -> bool:
         """Called when a replica fails."""
-        report = failure.report()
-        print(f"[MESH SERVICE] Failure: {report[:100]}...")
+        # failure.report() can build a large string. Only pay for it if the
+        # message will actually be emitted.
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("[MESH SERVICE] Failure: %.100s...", failure.report())
         return True
 
     @endpoint
     def get_replica(self):
         """
-        Get a healthy replica mesh (round-robin).
+        Get a healthy replica mesh (selected by self.balancer).
         Returns an ActorMesh - caller decides how to call it.
         """
-        if not self.healthy:
+        if not self._healthy_sorted:
             raise RuntimeError("No healthy replicas!")
 
-        healthy_list = sorted(self.healthy)
-        idx = self.next_idx % len(healthy_list)
-        self.next_idx += 1
-
-        replica_idx = healthy_list[idx]
+        replica_idx = self._pick()
         return self.replicas[replica_idx]
 
     @endpoint
     def get_replica_by_index(self, idx: int):
         """Get a specific replica by index."""
-        if idx not in self.healthy:
+        if not 0 <= idx < self.num_replicas or not self.healthy_mask & (1 << idx):
             raise RuntimeError(f"Replica {idx} is not healthy")
         return self.replicas[idx]
 
+    def _pick(self) -> int:
+        """Choose a healthy replica according to self.balancer.
+
+        power_of_two samples two distinct healthy replicas and keeps the one
+        with fewer failures in the last FAIL_WINDOW seconds. Only replicas
+        that were marked healthy again can have recent failures, so until
+        one recovers this behaves like random.
+        """
+        healthy = self._healthy_sorted
+        if self.balancer == "random":
+            # No shared counter to update, so nothing to contend on
+            return healthy[random.randrange(len(healthy))]
+        if self.balancer == "power_of_two":
+            if len(healthy) == 1:
+                return healthy[0]
+            a, b = random.sample(healthy, 2)
+            return a if self._recent_failures(a) <= self._recent_failures(b) else b
+
+        # Round-robin selection over the sorted list (consistent ordering)
+        idx = self.next_idx % len(healthy)
+        self.next_idx += 1
+        return healthy[idx]
+
+    def _recent_failures(self, idx: int) -> int:
+        """Number of times replica idx went down in the last FAIL_WINDOW seconds."""
+        times = self._fail_times[idx]
+        cutoff = time.monotonic() - FAIL_WINDOW
+        while times and times[0] < cutoff:
+            times.popleft()
+        return len(times)
+
+    def _build_status(self) -> dict:
+        return {
+            "total_replicas": self.num_replicas,
+            "procs_per_replica": self.procs_per_replica,
+            "healthy": len(self._healthy_sorted),
+            "healthy_indices": list(self._healthy_sorted),
+        }
+
+    def _rebuild_healthy(self) -> None:
+        """Recompute the sorted list of healthy replicas from the bitmask."""
+        self._healthy_sorted = [i for i in range(self.num_replicas) if self.healthy_mask & (1 << i)]
+        self._status_dict = self._build_status()
+
     @endpoint
     def mark_unhealthy(self, replica_idx: int) -> None:
         """Mark a replica as unhealthy."""
-        if replica_idx in self.healthy:
-            self.healthy.remove(replica_idx)
-            print(f"[MESH SERVICE] Replica {replica_idx} marked unhealthy. "
-                  f"Healthy: {len(self.healthy)}/{self.num_replicas}")
+        if not 0 <= replica_idx < self.num_replicas:
+            return
+        if self.healthy_mask & (1 << replica_idx):
+            self._fail_times[replica_idx].append(time.monotonic())
+            self.healthy_mask &= ~(1 << replica_idx)
+            self._rebuild_healthy()
+            self._log_event(f"[MESH SERVICE] Replica {replica_idx} marked unhealthy. "
+                            f"Healthy: {len(self._healthy_sorted)}/{self.num_replicas}")
 
     @endpoint
     def mark_healthy(self, replica_idx: int) -> None:
         """Mark a replica as healthy."""
-        if replica_idx < self.num_replicas:
-            self.healthy.add(replica_idx)
-            print(f"[MESH SERVICE] Replica {replica_idx} marked healthy.")
+        if 0 <= replica_idx < self.num_replicas:
+            self.healthy_mask |= 1 << replica_idx
+            self._rebuild_healthy()
+            self._log_event(f"[MESH SERVICE] Replica {replica_idx} marked healthy.")
+
+    def _log_event(self, msg: str) -> None:
+        """Buffer an event for flush_logs(); also print it when verbose."""
+        self._log.append((time.monotonic(), msg))
+        if self.verbose:
+            print(msg)
+
+    @endpoint
+    def flush_logs(self) -> list[tuple[float, str]]:
+        """Return and clear buffered (timestamp, message) events."""
+        out = list(self._log)
+        self._log.clear()
+        return out
 
     @endpoint
     def get_health_status(self) -> dict:
-        return {
-            "total_replicas": self.num_replicas,
-            "procs_per_replica": self.procs_per_replica,
-            "healthy": len(self.healthy),
-            "healthy_indices": sorted(self.healthy),
-        }
+        """Get current health status. Callers must not mutate the result."""
+        return self._status_dict
 
 
 # =============================================================================
@@ -220,6 +315,10 @@ def main():
         ranks = [r for _, r in results.items()]
         print(f"  Got replica with worker ranks: {ranks}")
 
+    print("\n--- Service event log ---")
+    for ts, msg in service.flush_logs.call_one().get():
+        print(f"  {msg}")
+
     print("\n--- Key Points ---")
     print("1. Service receives a ProcMesh, slices into replica chunks")
     print("2. Each replica is an ActorMesh (multiple workers)")
@@ -19,6 +19,9 @@
 # ]
 # ///
 
+import random
+import time
+from collections import deque
 from monarch.actor import Actor, endpoint, current_rank, this_host, get_or_spawn_controller
 
 
@@ -35,15 +38,19 @@ class ServiceRegistry(Actor):
     First caller spawns it, subsequent callers get the existing one.
     """
 
-    def __init__(self):
+    def __init__(self, verbose: bool = False):
         self.services: dict[str, Actor] = {}
+        # Events are buffered instead of printed, so a burst of registrations
+        # doesn't serialize endpoint calls on stdout. Read them with flush_logs().
+        self.verbose = verbose
+        self._log: deque[tuple[float, str]] = deque(maxlen=1024)
         print("[REGISTRY] ServiceRegistry spawned")
 
     @endpoint
     def register(self, name: str, service) -> None:
         """Register a service by name."""
         self.services[name] = service
-        print(f"[REGISTRY] Registered '{name}'")
+        self._log_event(f"[REGISTRY] Registered '{name}'")
 
     @endpoint
     def get(self, name: str):
@@ -52,6 +59,19 @@ class ServiceRegistry(Actor):
             raise KeyError(f"Service '{name}' not found. Available: {list(self.services.keys())}")
         return self.services[name]
 
+    def _log_event(self, msg: str) -> None:
+        """Buffer an event for flush_logs(); also print it when verbose."""
+        self._log.append((time.monotonic(), msg))
+        if self.verbose:
+            print(msg)
+
+    @endpoint
+    def flush_logs(self) -> list[tuple[float, str]]:
+        """Return and clear buffered (timestamp, message) events."""
+        out = list(self._log)
+        self._log.clear()
+        return out
+
     @endpoint
     def list_services(self) -> list[str]:
         """List all registered service names."""
@@ -62,7 +82,7 @@ class ServiceRegistry(Actor):
         """Unregister a service."""
         if name in self.services:
             del self.services[name]
-            print(f"[REGISTRY] Unregistered '{name}'")
+            self._log_event(f"[REGISTRY] Unregistered '{name}'")
             return True
         return False
 
@@ -97,11 +117,19 @@ class GeneratorService(Actor):
 
 
 class BufferService(Actor):
-    """A replay buffer service that registers itself."""
+    """A replay buffer service that registers itself.
 
-    def __init__(self, name: str = "buffer"):
+    Fixed-capacity ring buffer: once full, new items overwrite the oldest.
+    """
+
+    def __init__(self, name: str = "buffer", capacity: int = 1024):
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
         self.name = name
-        self.buffer: list[dict] = []
+        self.capacity = capacity
+        self.buffer: list[dict | None] = [None] * capacity
+        self.head = 0  # Next slot to write
+        self.count = 0  # Number of valid items
 
         # Register ourselves
         registry = get_or_spawn_controller("services", ServiceRegistry).get()
@@ -109,21 +137,32 @@ class BufferService(Actor):
 
     @endpoint
     def add(self, item: dict) -> int:
-        """Add an item to the buffer."""
-        self.buffer.append(item)
-        return len(self.buffer)
+        """Add an item to the buffer. Returns the current size."""
+        self.buffer[self.head] = item
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return self.count
 
     @endpoint
     def sample(self) -> dict:
         """Sample from the buffer."""
-        if not self.buffer:
+        if not self.count:
             return {"error": "Buffer empty"}
-        import random
-        return random.choice(self.buffer)
+        return self.buffer[random.randrange(self.count)]
+
+    @endpoint
+    def sample_batch(self, k: int) -> list[dict]:
+        """Sample k items in one call (one round-trip instead of k)."""
+        if k < 0:
+            raise ValueError(f"k must be non-negative, got {k}")
+        if not self.count:
+            return []
+        indices = random.choices(range(self.count), k=k)
+        return [self.buffer[i] for i in indices]
 
     @endpoint
     def size(self) -> int:
-        return len(self.buffer)
+        return self.count
 
 
 # =============================================================================
@@ -141,6 +180,22 @@ class Trainer(Actor):
         self.rank = current_rank().rank
         self.step = 0
 
+        # Find the registry once, and remember services after the first lookup.
+        # Every lookup is a blocking round-trip, so we don't want one per step.
+        self._registry = get_or_spawn_controller("services", ServiceRegistry).get()
+        self._svc_cache: dict[str, Actor] = {}
+
+    def _resolve(self, name: str):
+        """Look up a service by name, using the cached reference if we have one."""
+        if name not in self._svc_cache:
+            self._svc_cache[name] = self._registry.get.call_one(name).get()
+        return self._svc_cache[name]
+
+    @endpoint
+    def invalidate(self, name: str) -> None:
+        """Forget a cached service so the next step looks it up again."""
+        self._svc_cache.pop(name, None)
+
     @endpoint
     def train_step(self) -> dict:
         """
@@ -152,18 +207,20 @@ class Trainer(Actor):
         self.step += 1
 
         # Find services by name - no references passed to Trainer!
-        registry = get_or_spawn_controller("services", ServiceRegistry).get()
+        # After the first step these come from the local cache.
+        gen_service = self._resolve("generators")
+        buffer_service = self._resolve("buffer")
 
         # Get a generation
-        gen_service = registry.get.call_one("generators").get()
         generation = gen_service.generate.call_one(f"prompt_{self.step}").get()
 
-        # Add to buffer
-        buffer_service = registry.get.call_one("buffer").get()
-        buffer_size = buffer_service.add.call_one(generation).get()
-
-        # Sample for "training"
-        sample = buffer_service.sample.call_one().get()
+        # Add to buffer and sample for "training". Send both before waiting on
+        # either so their round-trips overlap. Messages from us to the buffer
+        # arrive in order, so the sample still sees this step's generation.
+        add_fut = buffer_service.add.call_one(generation)
+        sample_fut = buffer_service.sample.call_one()
+        buffer_size = add_fut.get()
+        sample = sample_fut.get()
 
         return {
             "trainer_rank": self.rank,
@@ -210,6 +267,10 @@ def main():
     # Show buffer contents
     print(f"\n--- Buffer has {buffer_service.size.call_one().get()} items ---")
 
+    print("\n--- Registry event log ---")
+    for ts, msg in registry.flush_logs.call_one().get():
+        print(f"  {msg}")
+
     print("\n--- Key Points ---")
     print("1. ServiceRegistry is a singleton via get_or_spawn_controller")
     print("2. Services register themselves on startup")